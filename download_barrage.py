@@ -1,15 +1,41 @@
 
 import argparse
 import asyncio
+import functools
+import io
 import json
+import os
 import re
+import subprocess
+import tempfile
+import threading
 import unicodedata
+import urllib.request
 from urllib.parse import urlparse
 from datetime import datetime, timezone
 from pathlib import Path
 from typing import List, Dict, Any
 
 from playwright.async_api import async_playwright, Page, BrowserContext
+from playwright.async_api import Error as PlaywrightError
+from playwright.async_api import TimeoutError as PlaywrightTimeoutError
+
+try:
+    # 可选依赖：装了 orjson 时用它解析/写出 json，快很多；没装则退回标准库 json
+    import orjson
+except ImportError:
+    orjson = None
+
+_SCHEME_RE = re.compile(r"https?://")
+_NONSLUG_RE = re.compile(r"[^a-zA-Z0-9._-]+")
+_WIN_BAD_RE = re.compile(r'[\\\\/:*?"<>|]')
+_WS_RE = re.compile(r"\s+")
+_LABEL_RE = re.compile(r"[^\w.\u4e00-\u9fff-]+", re.UNICODE)
+_DDASH_RE = re.compile(r"-{2,}")
+_DUND_RE = re.compile(r"_{2,}")
+
+# 弹幕只来自 getBarrage 这个 XHR，图片/视频/字体都不需要下载
+BLOCKED_RESOURCE_TYPES = frozenset({"image", "media", "font"})
 
 
 def parse_args() -> argparse.Namespace:
@@ -41,6 +67,16 @@ def parse_args() -> argparse.Namespace:
         default=Path("barrage_output"),
         help="保存 json 的目录，默认 barrage_output",
     )
+    parser.add_argument(
+        "--pretty",
+        action="store_true",
+        help="输出带缩进的 json（便于人工查看，文件更大、写入更慢），默认紧凑格式",
+    )
+    parser.add_argument(
+        "--include-headers",
+        action="store_true",
+        help="在输出中保存每个 getBarrage 响应的 headers，默认不保存",
+    )
     parser.add_argument(
         "--timeout",
         type=int,
@@ -51,13 +87,24 @@ def parse_args() -> argparse.Namespace:
         "--extra-wait",
         type=int,
         default=3,
-        help="拿到首个 getBarrage 后再等多久收集剩余请求（秒），默认 3",
+        help="拿到首个 getBarrage 后最多再等多久收集剩余请求（秒），0.5 秒内没有新请求会提前结束，默认 3",
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=4,
+        help="同时抓取的播放页数量（并发标签页数），默认 4",
     )
     parser.add_argument(
         "--headed",
         action="store_true",
         help="显示浏览器窗口（便于排查），默认 headless",
     )
+    parser.add_argument(
+        "--no-block-resources",
+        action="store_true",
+        help="不拦截图片/视频/字体等资源（默认拦截以节省带宽；排查页面显示问题时可关闭）",
+    )
     parser.add_argument(
         "--user-data-dir",
         type=Path,
@@ -77,6 +124,23 @@ def parse_args() -> argparse.Namespace:
         "--connect-over-cdp",
         help="连接到已开启 remote debugging 的浏览器（如手动启动的 Chrome），用于复用真实会话绕过验证",
     )
+    parser.add_argument(
+        "--shared-cdp-autostart",
+        action="store_true",
+        help="多个脚本实例共用同一个浏览器：端口上没有浏览器时自动启动一个带调试端口的 Chromium，之后每次运行都连接它并新建独立 context",
+    )
+    parser.add_argument(
+        "--shared-cdp-port",
+        type=int,
+        default=9222,
+        help="共享浏览器的 remote debugging 端口，默认 9222",
+    )
+    parser.add_argument(
+        "--shared-cdp-profile",
+        type=Path,
+        default=Path(tempfile.gettempdir()) / "iyf-danmu-shared-chromium",
+        help="自动启动共享浏览器时使用的用户目录，默认放在系统临时目录",
+    )
     parser.add_argument(
         "--storage-state",
         type=Path,
@@ -104,115 +168,294 @@ def read_urls(args: argparse.Namespace) -> List[str]:
             for line in args.url_file.read_text().splitlines()
             if line.strip()
         )
-    deduped = []
-    seen = set()
-    for u in urls:
-        if u not in seen:
-            deduped.append(u)
-            seen.add(u)
-    return deduped
+    return list(dict.fromkeys(urls))
 
 
 def slug_from_url(url: str) -> str:
-    slug = re.sub(r"https?://", "", url)
+    slug = _SCHEME_RE.sub("", url)
     slug = slug.rstrip("/")
     slug = slug.replace("/", "_")
-    slug = re.sub(r"[^a-zA-Z0-9._-]+", "-", slug)
+    slug = _NONSLUG_RE.sub("-", slug)
     return slug or "barrage"
 
 
+@functools.lru_cache(maxsize=4096)
 def sanitize_label(label: str) -> str:
     text = unicodedata.normalize("NFKC", label.strip())
     # 移除 Windows 不能用的路径字符
-    text = re.sub(r'[\\\\/:*?"<>|]', "-", text)
-    text = re.sub(r"\s+", "_", text)
+    text = _WIN_BAD_RE.sub("-", text)
+    text = _WS_RE.sub("_", text)
     # 允许中英文、数字、下划线、点、短横线
-    text = re.sub(r"[^\w.\u4e00-\u9fff-]+", "-", text, flags=re.UNICODE)
-    text = re.sub(r"-{2,}", "-", text)
-    text = re.sub(r"_{2,}", "_", text)
+    text = _LABEL_RE.sub("-", text)
+    text = _DDASH_RE.sub("-", text)
+    text = _DUND_RE.sub("_", text)
     text = text.strip("._-")
     return text or "episode"
 
 
+def write_payload(out_path: Path, payload: Dict[str, Any], pretty: bool = False) -> None:
+    """先写到同目录的临时文件再原子替换，避免并发写同名文件时内容互相覆盖"""
+    tmp_path = out_path.with_name(f".{out_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        # 直接流式写入文件，避免先拼出整个 json 字符串
+        with open(tmp_path, "wb", buffering=64 * 1024) as fp:
+            if orjson:
+                fp.write(orjson.dumps(payload, option=orjson.OPT_INDENT_2 if pretty else 0))
+            else:
+                text_fp = io.TextIOWrapper(fp, encoding="utf-8")
+                if pretty:
+                    json.dump(payload, text_fp, ensure_ascii=False, indent=2)
+                else:
+                    json.dump(payload, text_fp, ensure_ascii=False, separators=(",", ":"))
+                text_fp.flush()
+                text_fp.detach()
+        os.replace(tmp_path, out_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+
+def cdp_endpoint_alive(endpoint: str) -> bool:
+    # 本机端口不能走 http_proxy 等代理，否则探测永远失败、会重复启动浏览器
+    opener = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+    try:
+        with opener.open(f"{endpoint}/json/version", timeout=1) as resp:
+            return resp.status == 200
+    except Exception:
+        return False
+
+
+async def ensure_shared_browser(
+    executable: str, port: int, profile_dir: Path, headed: bool, startup_timeout_s: int = 15
+) -> str:
+    """确保本机端口上有一个可供多个实例共用的浏览器，必要时启动它，返回 CDP 地址"""
+    endpoint = f"http://127.0.0.1:{port}"
+    if await asyncio.to_thread(cdp_endpoint_alive, endpoint):
+        return endpoint
+
+    profile_dir.mkdir(parents=True, exist_ok=True)
+    cmd = [
+        executable,
+        f"--remote-debugging-port={port}",
+        f"--user-data-dir={profile_dir}",
+        "--disable-blink-features=AutomationControlled",
+        "--no-first-run",
+        "--no-default-browser-check",
+    ]
+    if not headed:
+        cmd.append("--headless=new")
+    # 用普通 Popen 启动（不归事件循环管理），并放到单独的会话组，
+    # 脚本退出后浏览器继续留给其他实例使用
+    await asyncio.to_thread(
+        subprocess.Popen,
+        cmd,
+        stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+    print(f"已启动共享浏览器: {endpoint}")
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + startup_timeout_s
+    while loop.time() < deadline:
+        if await asyncio.to_thread(cdp_endpoint_alive, endpoint):
+            return endpoint
+        await asyncio.sleep(0.2)
+    raise RuntimeError(f"共享浏览器在 {startup_timeout_s} 秒内未就绪: {endpoint}")
+
+
+async def block_heavy_resources(route) -> None:
+    if route.request.resource_type in BLOCKED_RESOURCE_TYPES:
+        await route.abort()
+    else:
+        await route.continue_()
+
+
+async def wait_for_quiescence(
+    hits: List[Any], max_wait_s: float, quiet_s: float = 0.5, poll_s: float = 0.1
+) -> None:
+    """等到 hits 在 quiet_s 内不再增长，最多等 max_wait_s 秒"""
+    loop = asyncio.get_running_loop()
+    now = loop.time()
+    deadline = now + max_wait_s
+    last_n, last_change = len(hits), now
+    while now < deadline:
+        await asyncio.sleep(poll_s)
+        now = loop.time()
+        if len(hits) != last_n:
+            last_n, last_change = len(hits), now
+        elif now - last_change >= quiet_s:
+            break
+
+
+async def save_storage_state(context: BrowserContext, path: Path) -> bool:
+    """保存 storageState；内容与上次保存的一致时跳过写盘，返回是否写入"""
+    state = await context.storage_state()
+    data = orjson.dumps(state) if orjson else json.dumps(state, ensure_ascii=False).encode("utf-8")
+    # 直接和磁盘上的文件内容比较，手动替换/编辑过的文件也能正确判断
+    if path.exists() and path.read_bytes() == data:
+        return False
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return True
+
+
+async def reset_tab(context: BrowserContext, page: Page) -> Page:
+    """归还标签页前清空当前页面，避免上一集的迟到请求混进下一集；标签页已崩溃/关闭时换一个新的"""
+    if not page.is_closed():
+        try:
+            await page.goto("about:blank")
+            return page
+        except Exception:
+            try:
+                await page.close()
+            except Exception:
+                pass
+    try:
+        return await context.new_page()
+    except Exception:
+        # 连新标签页都开不了时只能原样归还，保证池子大小不变、其他协程不会一直等
+        return page
+
+
 async def collect_barrage_for_page(
-    context: BrowserContext, url: str, timeout_s: int, extra_wait_s: int
+    page: Page,
+    url: str,
+    timeout_s: int,
+    extra_wait_s: int,
+    include_headers: bool = False,
 ) -> List[Dict[str, Any]]:
-    page: Page = await context.new_page()
+    """在给定标签页中打开播放页并收集 getBarrage 响应；标签页由调用方复用和关闭"""
     collected: List[Dict[str, Any]] = []
     tasks: List[asyncio.Task] = []
 
-    async def handle_response(response):
-        if "getBarrage" not in response.url:
-            return
-        try:
-            body = await response.json()
-        except Exception:
-            body = await response.text()
-        collected.append(
-            {
-                "api_url": response.url,
-                "status": response.status,
-                "headers": dict(response.headers),
-                "body": body,
-            }
-        )
+    marker = "getBarrage"
 
-    page.on("response", lambda r: tasks.append(asyncio.create_task(handle_response(r))))
+    async def handle_response(response):
+        headers = response.headers
+        raw = await response.body()
+        # 明显不是 json 的响应直接按文本保存，避免走解析失败的异常分支；
+        # 有的接口 content-type 不规范，所以也看一眼正文开头
+        body: Any
+        if "json" in headers.get("content-type", "") or raw.lstrip()[:1] in (b"{", b"["):
+            try:
+                body = orjson.loads(raw) if orjson else json.loads(raw)
+            except ValueError:
+                body = raw.decode("utf-8", "replace")
+        else:
+            body = raw.decode("utf-8", "replace")
+        rec: Dict[str, Any] = {
+            "api_url": response.url,
+            "status": response.status,
+            "body": body,
+        }
+        if include_headers:
+            rec["headers"] = headers
+        collected.append(rec)
 
-    try:
-        await page.goto(url, wait_until="networkidle")
-    except Exception:
-        await page.goto(url)
+    def on_response(response):
+        # 同步过滤掉图片/分片等无关响应，只为 getBarrage 创建任务
+        if marker in response.url:
+            tasks.append(asyncio.create_task(handle_response(response)))
 
+    listening = False
+    hit_task = goto_task = None
     try:
-        await page.wait_for_response(lambda r: "getBarrage" in r.url, timeout=timeout_s * 1000)
-        await page.wait_for_timeout(extra_wait_s * 1000)
-    except Exception:
-        pass
+        page.on("response", on_response)
+        listening = True
+        # 只关心 getBarrage：导航只等到 commit，与等待首个 getBarrage 响应同时进行，
+        # 播放器在 DOMContentLoaded 之前就发出的请求也能立刻拿到
+        # （Python 版 Playwright 没有 page.wait_for_response，要用 wait_for_event）
+        hit_task = asyncio.create_task(
+            page.wait_for_event(
+                "response", predicate=lambda r: marker in r.url, timeout=timeout_s * 1000
+            )
+        )
+        goto_task = asyncio.create_task(
+            page.goto(url, wait_until="commit", timeout=timeout_s * 1000)
+        )
+        await asyncio.wait({goto_task, hit_task}, return_when=asyncio.FIRST_COMPLETED)
+        nav_failed = False
+        try:
+            await asyncio.wait_for(asyncio.shield(goto_task), timeout=2)
+        except (asyncio.TimeoutError, PlaywrightTimeoutError):
+            # 导航慢不影响监听器继续收集，不重新打开页面
+            pass
+        except PlaywrightError as exc:
+            # Playwright 的导航错误没有错误码，只能看 Chromium 的 net::ERR_* 名称判断页面是否确实打不开；
+            # SPA 在 commit 后立刻跳转导致的 "interrupted by another navigation" 等不算失败，继续等 getBarrage
+            nav_failed = "net::ERR_" in exc.message
+
+        got_hit = False
+        if not nav_failed or hit_task.done():
+            try:
+                await hit_task
+                got_hit = True
+            except Exception:
+                pass
+        if got_hit:
+            await wait_for_quiescence(tasks, max_wait_s=extra_wait_s)
+    finally:
+        started = [task for task in (goto_task, hit_task) if task is not None]
+        for task in started:
+            if not task.done():
+                task.cancel()
+        await asyncio.gather(*started, return_exceptions=True)
+        # 标签页会被下一集复用，必须摘掉本集的监听器
+        if listening:
+            page.remove_listener("response", on_response)
 
     if tasks:
         await asyncio.gather(*tasks, return_exceptions=True)
-    await page.close()
     return collected
 
 
-async def extract_episode_urls(context: BrowserContext, playlist_url: str) -> List[Dict[str, str]]:
+async def extract_episode_urls(
+    context: BrowserContext, playlist_url: str, timeout_s: int = 15
+) -> List[Dict[str, str]]:
     """从剧集列表页提取当前剧集的 /play/ 链接（去重保留顺序），附带标题文本"""
-    page: Page = await context.new_page()
-    try:
-        await page.goto(playlist_url, wait_until="networkidle")
-    except Exception:
-        await page.goto(playlist_url)
-    anchors: List[Dict[str, str]] = await page.eval_on_selector_all(
-        "a[href*='/play/']",
-        """els => {
-            return els.map(el => ({
-                href: el.href,
-                text: (el.textContent || '').trim()
-            }));
-        }""",
-    )
-    await page.close()
-    if not anchors:
-        return []
-
     parsed = urlparse(playlist_url)
     base_slug = parsed.path.rstrip("/").split("/")[-1] if "/play/" in parsed.path else None
-    results: List[Dict[str, str]] = []
-    seen = set()
-    for item in anchors:
-        href = item.get("href") or ""
-        text = item.get("text") or ""
-        if not href:
-            continue
-        if base_slug and f"/play/{base_slug}" not in href:
-            # 过滤掉推荐的其他剧
-            continue
-        if href in seen:
-            continue
-        seen.add(href)
-        results.append({"url": href, "title": text})
-    return results
+    needle = f"/play/{base_slug}" if base_slug else "/play/"
+    needle_selector = 'a[href*="{}"]'.format(needle.replace("\\", "\\\\").replace('"', '\\"'))
+
+    page: Page = await context.new_page()
+    try:
+        # 只导航一次，并且和等待剧集链接共用同一个截止时间；超时就用当前已渲染的 DOM
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout_s
+        try:
+            await page.goto(playlist_url, wait_until="domcontentloaded", timeout=timeout_s * 1000)
+            remaining_ms = max(0.0, deadline - loop.time()) * 1000
+            # 等本剧的链接出现，而不是任意 /play/ 链接（推荐区可能先渲染）
+            await page.wait_for_selector(needle_selector, timeout=max(1.0, remaining_ms))
+        except PlaywrightTimeoutError:
+            pass
+        # 过滤掉推荐的其他剧并去重，都在页面内完成，只把需要的条目传回 Python
+        anchors: List[Dict[str, str]] = await page.eval_on_selector_all(
+            "a[href*='/play/']",
+            """(els, needle) => {
+                const seen = new Set();
+                return els
+                    .filter(el => {
+                        const href = el.href;
+                        if (!href || !href.includes(needle) || seen.has(href)) {
+                            return false;
+                        }
+                        seen.add(href);
+                        return true;
+                    })
+                    .map(el => ({
+                        url: el.href,
+                        title: (el.textContent || '').trim()
+                    }));
+            }""",
+            needle,
+        )
+    finally:
+        await page.close()
+    return anchors
 
 
 async def main():
@@ -228,6 +471,8 @@ async def main():
     async with async_playwright() as p:
         browser = None
         context = None
+        # 连接到外部浏览器时可能直接用用户自己的 context，不能改动它（拦截资源会影响用户正在用的标签页）
+        attached_context = False
         launch_args = {
             "headless": not args.headed,
             "args": ["--disable-blink-features=AutomationControlled"],
@@ -240,12 +485,33 @@ async def main():
             browser = await p.chromium.connect_over_cdp(args.connect_over_cdp)
             if browser.contexts:
                 context = browser.contexts[0]
+                attached_context = True
             else:
                 context = await browser.new_context(
                     user_agent=args.user_agent,
                     locale=args.accept_language.split(",")[0],
                 )
             print(f"已连接到现有浏览器: {args.connect_over_cdp}")
+        elif args.shared_cdp_autostart:
+            # 共用一个浏览器进程，每次运行只新建自己的 context
+            endpoint = await ensure_shared_browser(
+                str(args.executable_path) if args.executable_path else p.chromium.executable_path,
+                port=args.shared_cdp_port,
+                profile_dir=args.shared_cdp_profile,
+                headed=args.headed,
+            )
+            browser = await p.chromium.connect_over_cdp(endpoint)
+            storage_state_arg = None
+            if args.storage_state and args.storage_state.exists():
+                storage_state_arg = args.storage_state
+                print(f"加载 storageState: {args.storage_state}")
+
+            context = await browser.new_context(
+                storage_state=storage_state_arg,
+                user_agent=args.user_agent,
+                locale=args.accept_language.split(",")[0],
+            )
+            print(f"已连接到共享浏览器: {endpoint}")
         elif args.user_data_dir:
             # 持久化 profile，尽量模拟真实浏览器
             args.user_data_dir.mkdir(parents=True, exist_ok=True)
@@ -273,49 +539,74 @@ async def main():
             if args.executable_path:
                 print(f"使用指定浏览器内核: {args.executable_path}")
 
+        if not args.no_block_resources and not attached_context:
+            await context.route("**/*", block_heavy_resources)
+
         # 如果提供了剧集列表页，先解析得到所有剧集播放链接
         episode_entries: List[Dict[str, str]] = [{"url": u, "title": ""} for u in urls]
         if args.playlist_urls:
-            for playlist_url in args.playlist_urls:
-                print(f"解析剧集列表页: {playlist_url}")
+            playlist_sem = asyncio.Semaphore(max(1, args.concurrency))
+
+            async def parse_playlist(playlist_url: str) -> List[Dict[str, str]]:
                 try:
-                    episodes = await extract_episode_urls(context, playlist_url)
+                    # 和播放页一样受 --concurrency 限制，避免一次开太多标签页
+                    async with playlist_sem:
+                        print(f"解析剧集列表页: {playlist_url}")
+                        episodes = await extract_episode_urls(
+                            context, playlist_url, timeout_s=args.timeout
+                        )
                 except Exception as exc:
-                    print(f"  解析失败: {exc}")
-                    episodes = []
+                    print(f"  解析失败: {playlist_url}: {exc}")
+                    return []
                 if episodes:
-                    print(f"  获取到 {len(episodes)} 个播放链接")
-                    episode_entries.extend(episodes)
+                    print(f"  获取到 {len(episodes)} 个播放链接: {playlist_url}")
                 else:
-                    print("  未获取到播放链接")
+                    print(f"  未获取到播放链接: {playlist_url}")
+                return episodes
+
+            # 多个列表页并发解析，结果按输入顺序合并
+            playlist_results = await asyncio.gather(
+                *(parse_playlist(u) for u in args.playlist_urls)
+            )
+            for episodes in playlist_results:
+                episode_entries.extend(episodes)
 
         if not episode_entries:
             print("未获得任何播放页链接，退出。")
             return
 
         # 去重保持顺序
-        seen_urls = set()
-        unique_entries: List[Dict[str, str]] = []
+        by_url: Dict[str, Dict[str, str]] = {}
         for item in episode_entries:
-            url = item["url"]
-            if url in seen_urls:
-                continue
-            seen_urls.add(url)
-            unique_entries.append(item)
+            by_url.setdefault(item["url"], item)
+        unique_entries: List[Dict[str, str]] = list(by_url.values())
 
         total = len(unique_entries)
-        for idx, entry in enumerate(unique_entries, start=1):
+        series_prefix = sanitize_label(args.series_name) if args.series_name else ""
+        # 预先创建固定数量的标签页组成池，每集取一个用完归还，同时限制并发
+        tab_pool: "asyncio.Queue[Page]" = asyncio.Queue()
+        for _ in range(max(1, min(args.concurrency, total))):
+            await tab_pool.put(await context.new_page())
+
+        async def run_one(idx: int, entry: Dict[str, str]) -> None:
             url = entry["url"]
             title = sanitize_label(entry.get("title") or "") if entry.get("title") else ""
-            print(f"[{idx}/{total}] 访问: {url}")
-            barrages = await collect_barrage_for_page(
-                context, url, timeout_s=args.timeout, extra_wait_s=args.extra_wait
-            )
+            page = await tab_pool.get()
+            try:
+                print(f"[{idx}/{total}] 访问: {url}")
+                barrages = await collect_barrage_for_page(
+                    page,
+                    url,
+                    timeout_s=args.timeout,
+                    extra_wait_s=args.extra_wait,
+                    include_headers=args.include_headers,
+                )
+            finally:
+                await tab_pool.put(await reset_tab(context, page))
             if not barrages:
-                print("  未捕获到 getBarrage 响应，可能页面未加载或需要登录。")
-                continue
+                print(f"  [{idx}/{total}] 未捕获到 getBarrage 响应，可能页面未加载或需要登录。")
+                return
             name_parts: List[str] = []
-            series_prefix = sanitize_label(args.series_name) if args.series_name else ""
             # 避免标题仅为数字且等于索引时重复
             title_is_duplicate = title and title.lower() in {f"{idx:02d}", f"ep{idx:02d}"}
             label = title if (title and not title_is_duplicate) else f"ep{idx:02d}"
@@ -337,12 +628,30 @@ async def main():
                 "count": len(barrages),
                 "requests": barrages,
             }
-            out_path.write_text(json.dumps(payload, ensure_ascii=False, indent=2))
-            print(f"  已保存 {len(barrages)} 条到 {out_path}")
+            # 写盘放到线程里，事件循环可以继续驱动其他标签页
+            await asyncio.to_thread(write_payload, out_path, payload, args.pretty)
+            print(f"  [{idx}/{total}] 已保存 {len(barrages)} 条到 {out_path}")
+
+        results = await asyncio.gather(
+            *(run_one(idx, entry) for idx, entry in enumerate(unique_entries, start=1)),
+            return_exceptions=True,
+        )
+        for entry, result in zip(unique_entries, results):
+            if isinstance(result, BaseException):
+                print(f"抓取失败: {entry['url']}: {result}")
+
+        while not tab_pool.empty():
+            page = tab_pool.get_nowait()
+            try:
+                await page.close()
+            except Exception:
+                pass
+
         if args.save_storage_state and args.storage_state and not args.user_data_dir:
-            args.storage_state.parent.mkdir(parents=True, exist_ok=True)
-            await context.storage_state(path=str(args.storage_state))
-            print(f"已保存 storageState 到 {args.storage_state}")
+            if await save_storage_state(context, args.storage_state):
+                print(f"已保存 storageState 到 {args.storage_state}")
+            else:
+                print(f"storageState 未变化，跳过保存: {args.storage_state}")
         if browser:
             await browser.close()
         else:
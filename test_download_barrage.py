@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("playwright")
+
+import download_barrage  # noqa: E402
+
+
+class FakeResponse:
+    def __init__(self, url: str, body: bytes = b'{"data": []}'):
+        self.url = url
+        self.status = 200
+        self.headers = {"content-type": "application/json"}
+        self._body = body
+
+    async def body(self) -> bytes:
+        return self._body
+
+
+class FakePage:
+    """只实现 collect_barrage_for_page 用到的 Page 方法：goto 之后按 (延迟, 响应) 依次派发"""
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.listeners = []
+        self.waiters = []
+
+    def on(self, event, handler):
+        self.listeners.append(handler)
+
+    def remove_listener(self, event, handler):
+        self.listeners.remove(handler)
+
+    async def goto(self, url, **kwargs):
+        asyncio.get_running_loop().create_task(self._fire())
+
+    async def _fire(self):
+        for delay, response in self.responses:
+            await asyncio.sleep(delay)
+            for handler in list(self.listeners):
+                handler(response)
+            for predicate, fut in self.waiters:
+                if not fut.done() and predicate(response):
+                    fut.set_result(response)
+
+    async def wait_for_event(self, event, predicate=None, timeout=None):
+        fut = asyncio.get_running_loop().create_future()
+        self.waiters.append((predicate, fut))
+        return await asyncio.wait_for(fut, timeout / 1000)
+
+
+def test_wait_for_quiescence_stops_once_hits_stop_growing():
+    async def run():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        await download_barrage.wait_for_quiescence([1], max_wait_s=5, quiet_s=0.2)
+        return loop.time() - start
+
+    assert asyncio.run(run()) < 1
+
+
+def test_collect_barrage_runs_quiescence_after_first_hit(monkeypatch):
+    calls = []
+    real_wait = download_barrage.wait_for_quiescence
+
+    async def spy(hits, max_wait_s, **kwargs):
+        calls.append(max_wait_s)
+        await real_wait(hits, max_wait_s, **kwargs)
+
+    monkeypatch.setattr(download_barrage, "wait_for_quiescence", spy)
+    page = FakePage(
+        [
+            (0.05, FakeResponse("https://example.com/cover.jpg")),
+            (0.05, FakeResponse("https://example.com/api/getBarrage?page=1")),
+            (0.2, FakeResponse("https://example.com/api/getBarrage?page=2")),
+        ]
+    )
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        collected = await download_barrage.collect_barrage_for_page(
+            page, "https://example.com/play/x", timeout_s=5, extra_wait_s=5
+        )
+        return collected, loop.time() - start
+
+    collected, elapsed = asyncio.run(run())
+    assert calls == [5]
+    # 第二个 getBarrage 在静默窗口内到达，会被收集；之后没有新请求就提前结束，不必等满 extra_wait
+    assert [rec["api_url"] for rec in collected] == [
+        "https://example.com/api/getBarrage?page=1",
+        "https://example.com/api/getBarrage?page=2",
+    ]
+    assert elapsed < 3
+    assert page.listeners == []